@@ -5,6 +5,9 @@ Utility to create a SQLAlchemy Engine for reuse across functions.
 
 Provides:
     - make_engine(...) -> sqlalchemy.engine.Engine
+    - get_engine(conn_str) -> sqlalchemy.engine.Engine (cached per connection string)
+    - reflect_table(conn_str, table_name) -> sqlalchemy.Table (cached per connection string and table)
+    - insert_dataframe(engine, table_name, df) -> int
 
 Features:
     - Accepts either a full connection string or discrete connection components.
@@ -12,8 +15,11 @@ Features:
     - Returns a ready-to-use SQLAlchemy Engine (call .dispose() when done).
 """
 
+from functools import lru_cache
+from itertools import islice
 from typing import Optional, Dict, Any
-from sqlalchemy import create_engine
+import pandas as pd
+from sqlalchemy import create_engine, event, insert, MetaData, Table, Date, DateTime
 from sqlalchemy.engine import Engine, URL
 
 
@@ -101,3 +107,144 @@ def make_engine(
         **kwargs,
     )
     return engine
+
+
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-65536",
+)
+
+
+@lru_cache(maxsize=None)
+def get_engine(conn_str: str) -> Engine:
+    """
+    Return a process-wide Engine for the given connection string.
+
+    The Engine is created once by make_engine and then reused, so its
+    connection pool survives between requests. Do not call .dispose() on it.
+    For SQLite every new DBAPI connection is switched to WAL journaling with
+    synchronous=NORMAL, in-memory temp storage and a 64 MiB page cache.
+
+    Parameters
+    - conn_str: Full SQLAlchemy connection string (e.g. "sqlite:///app/data/app.db").
+
+    Returns:
+    - sqlalchemy.engine.Engine
+    """
+    engine = make_engine(conn_str)
+
+    if engine.dialect.name == "sqlite":
+        @event.listens_for(engine, "connect")
+        def _set_sqlite_pragmas(dbapi_conn, _record):
+            cursor = dbapi_conn.cursor()
+            for pragma in SQLITE_PRAGMAS:
+                cursor.execute(pragma)
+            cursor.close()
+
+    return engine
+
+
+@lru_cache(maxsize=16)
+def reflect_table(conn_str: str, table_name: str) -> Table:
+    """
+    Reflect a table once per (connection string, table name) and reuse it.
+
+    Reflection issues several PRAGMA/catalog queries, so the resulting Table
+    is cached. A failed reflection (e.g. the table does not exist yet) raises
+    and is not cached, so the next call retries.
+
+    Parameters
+    - conn_str: Full SQLAlchemy connection string, passed to get_engine.
+    - table_name: Name of the table to reflect.
+
+    Returns:
+    - sqlalchemy.Table
+    """
+    return Table(table_name, MetaData(), autoload_with=get_engine(conn_str))
+
+
+def _sqlite_literals(df: pd.DataFrame, table: Table) -> pd.DataFrame:
+    """
+    Convert DATE/DATETIME columns to the strings SQLAlchemy stores in SQLite,
+    so rows bound directly through the DBAPI match rows written by to_sql.
+    """
+    converted = {}
+    for column in table.columns:
+        if column.name not in df.columns:
+            continue
+        if isinstance(column.type, DateTime):
+            fmt = "%Y-%m-%d %H:%M:%S.%f"
+        elif isinstance(column.type, Date):
+            fmt = "%Y-%m-%d"
+        else:
+            continue
+        values = pd.to_datetime(df[column.name]).dt.strftime(fmt).astype(object)
+        converted[column.name] = values.where(values.notna(), None)
+
+    return df.assign(**converted)
+
+
+def insert_dataframe(
+    engine: Engine,
+    table_name: str,
+    df: pd.DataFrame,
+    index: bool = True,
+    chunksize: int = 10_000,
+    dtype: Optional[Dict[str, Any]] = None,
+) -> int:
+    """
+    Append the rows of a DataFrame to a table in a single transaction.
+
+    The rows are sent as one parameterized INSERT executed with executemany,
+    instead of the single multi-row VALUES statement built by
+    to_sql(method="multi"), which hits SQLite's bound-parameter limit on
+    large frames. On SQLite the row tuples from itertuples are bound directly
+    through the DBAPI cursor, skipping per-row dicts and SQLAlchemy's
+    per-value type processing; date/time columns are pre-formatted once,
+    column-wise. Other databases go through a SQLAlchemy insert().
+
+    Parameters
+    - engine: Engine returned by make_engine.
+    - table_name: Target table. Created by pandas from the DataFrame dtypes if missing.
+    - df: Data to insert.
+    - index: If True, the DataFrame index is written as a column and, when the table
+             is created, gets a database index (as in to_sql).
+    - chunksize: Number of rows bound per executemany call. Rows are read with
+                 itertuples, so only one chunk of parameters exists at a time.
+    - dtype: Optional column -> SQLAlchemy type mapping used when the table is
+             created (as in to_sql), e.g. {"business_date": Date}.
+
+    Returns:
+    - Number of inserted rows.
+    """
+    if len(df) == 0:
+        return 0
+
+    with engine.begin() as conn:
+        # the first row goes through pandas so a missing table is created with its type
+        # mapping and, as with to_sql(index=True), an index on the DataFrame index column
+        df.iloc[:1].to_sql(name=table_name, con=conn, if_exists="append", index=index, dtype=dtype)
+        table = Table(table_name, MetaData(), autoload_with=conn)
+
+        if index:
+            df = df.reset_index()
+
+        cols = list(df.columns)
+        rest = df.iloc[1:]
+        raw = conn.dialect.name == "sqlite"
+        if raw:
+            quote = conn.dialect.identifier_preparer.quote
+            sql = (f"INSERT INTO {quote(table_name)} ({', '.join(quote(c) for c in cols)}) "
+                   f"VALUES ({', '.join('?' * len(cols))})")
+            rest = _sqlite_literals(rest, table)
+
+        rows = rest.itertuples(index=False, name=None)
+        while chunk := list(islice(rows, chunksize)):
+            if raw:
+                conn.exec_driver_sql(sql, chunk)
+            else:
+                conn.execute(insert(table), [dict(zip(cols, row)) for row in chunk])
+
+    return len(df)
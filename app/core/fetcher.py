@@ -1,17 +1,18 @@
 import requests
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from typing import List
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 from config.settings import settings
 from datetime import timedelta, date
 
-def fetch_data_pse_inner(bdate: date, select_columns: List[str] = None) -> pd.DataFrame:
+PSE_MAX_WORKERS = 16
+POOL_SIZE = 32
 
-    params = {"$filter": f"business_date eq '{bdate.isoformat()}'",}
-
-    if select_columns is not None:
-        params["$select"] = ",".join(select_columns)
+@lru_cache(maxsize=1)
+def _get_session() -> requests.Session:
 
     session = requests.Session()
     retry_strategy = Retry(
@@ -21,12 +22,21 @@ def fetch_data_pse_inner(bdate: date, select_columns: List[str] = None) -> pd.Da
             allowed_methods=["GET"]
             )
 
-    adapter = HTTPAdapter(max_retries=retry_strategy)
+    adapter = HTTPAdapter(max_retries=retry_strategy, pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
     session.mount("http://", adapter)
     session.mount("https://", adapter)
-    
+
+    return session
+
+def fetch_data_pse_inner(bdate: date, select_columns: List[str] = None) -> pd.DataFrame:
+
+    params = {"$filter": f"business_date eq '{bdate.isoformat()}'",}
+
+    if select_columns is not None:
+        params["$select"] = ",".join(select_columns)
+
     try:
-        response = session.get(settings.API_URL_PSE, params=params, timeout=20)
+        response = _get_session().get(settings.API_URL_PSE, params=params, timeout=20)
         response.raise_for_status()
         raw_json = response.json()
         if "value" in raw_json:
@@ -39,15 +49,12 @@ def fetch_data_pse_inner(bdate: date, select_columns: List[str] = None) -> pd.Da
 
 def fetch_data_pse(start_date: date, end_date: date, select_columns: List[str]) -> pd.DataFrame:
 
-    current_date = start_date
-    df = pd.DataFrame()
+    dates = [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
 
-    while current_date <= end_date:
-        day_df = fetch_data_pse_inner(current_date, select_columns)
-        df = pd.concat([df, day_df], ignore_index=True)
-        current_date += timedelta(days=1)
+    with ThreadPoolExecutor(max_workers=PSE_MAX_WORKERS) as executor:
+        frames = list(executor.map(lambda d: fetch_data_pse_inner(d, select_columns), dates))
 
-    return df
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
 
 def fetch_data_meteo(
         latitude: float,
@@ -64,20 +71,8 @@ def fetch_data_meteo(
     else:
         api_url = settings.API_URL_METEO_FRCST
 
-    session = requests.Session()
-    retry_strategy = Retry(
-            total=5,
-            backoff_factor=1,
-            status_forcelist=[429, 500, 502, 503, 504],
-            allowed_methods=["GET"]
-            )
-
-    adapter = HTTPAdapter(max_retries=retry_strategy)
-    session.mount("http://", adapter)
-    session.mount("https://", adapter)
-
     try:
-        response = session.get(api_url, params=params, timeout=20)
+        response = _get_session().get(api_url, params=params, timeout=20)
         response.raise_for_status()
         raw_json = response.json()
         if "hourly" in raw_json:
@@ -85,6 +80,6 @@ def fetch_data_meteo(
             return df
         else:
             return pd.DataFrame()
-    except requests.exceptions.RequestsException:
+    except requests.exceptions.RequestException:
         return pd.DataFrame()
 
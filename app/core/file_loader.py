@@ -1,15 +1,44 @@
-from typing import List
+from typing import BinaryIO, List, Union
 import pandas as pd
-from io import BytesIO, StringIO
+import pyarrow.csv as pacsv
+from io import BytesIO
 
-def load_file_to_dataframe(filename: str, content: bytes, headers: List [str]) -> pd.DataFrame:
+# rozmiar bloku czytanego przez parser CSV - pamięć zależy od bloku, nie od rozmiaru pliku
+CSV_BLOCK_SIZE = 1 << 20
+
+def _as_stream(source: Union[bytes, BinaryIO]) -> BinaryIO:
+    return BytesIO(source) if isinstance(source, (bytes, bytearray)) else source
+
+def _read_delimited(source: Union[bytes, BinaryIO], headers: List[str], delimiter: str) -> pd.DataFrame:
+    # pyarrow parsuje UTF-8 bezpośrednio ze strumienia, blokami i wielowątkowo
+    table = pacsv.read_csv(
+        _as_stream(source),
+        read_options=pacsv.ReadOptions(column_names=headers, block_size=CSV_BLOCK_SIZE),
+        parse_options=pacsv.ParseOptions(delimiter=delimiter),
+    )
+
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+def _read_excel(source: Union[bytes, BinaryIO], headers: List[str]) -> pd.DataFrame:
+    stream = _as_stream(source)
+    # calamine (Rust) jest wielokrotnie szybszy od openpyxl, ale jest opcjonalny
+    try:
+        return pd.read_excel(stream, names=headers, engine="calamine")
+    except ImportError:
+        stream.seek(0)
+        return pd.read_excel(stream, names=headers)
+
+def load_file_to_dataframe(filename: str, source: Union[bytes, BinaryIO], headers: List [str]) -> pd.DataFrame:
+    """
+    source – zawartość pliku (bytes) albo otwarty strumień binarny, np. UploadFile.file
+    """
     filename = filename.lower()
 
     if filename.endswith(".csv"):
-        return pd.read_csv(StringIO(content.decode("utf-8")), names=headers)
+        return _read_delimited(source, headers, ",")
     if filename.endswith(".xlsx") or filename.endswith(".xls"):
-        return pd.read_excel(BytesIO(content), names=headers)
+        return _read_excel(source, headers)
     if filename.endswith(".txt"):
-        return pd.read_csv(StringIO(content.decode("utf-8")), sep="\t", names=headers)
+        return _read_delimited(source, headers, "\t")
 
-    raise ValueError("Nieobsługiwany format plików")
\ No newline at end of file
+    raise ValueError("Nieobsługiwany format plików")
@@ -0,0 +1,34 @@
+from pathlib import Path
+from uuid import uuid4
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+def write_partitioned_parquet(df: pd.DataFrame, path: str, partition_col: str, max_rows: int) -> None:
+    """
+    Zapisuje DataFrame (z indeksem) jako zbiór parquet podzielony na partycje
+    w stylu hive (partition_col=wartość), najwyżej max_rows wierszy na plik.
+    """
+    output_path = Path(path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+
+    table = pa.Table.from_pandas(df, preserve_index=True)
+
+    # partycje po dacie nazwane samą datą (date32), a nie znacznikiem czasu
+    i = table.schema.get_field_index(partition_col)
+    if pa.types.is_timestamp(table.schema.field(i).type):
+        table = table.set_column(i, partition_col, table.column(i).cast(pa.date32()))
+
+    # unikalna nazwa plików, aby kolejne zapisy nie nadpisywały istniejących części
+    ds.write_dataset(
+        table,
+        base_dir=output_path,
+        format="parquet",
+        partitioning=[partition_col],
+        partitioning_flavor="hive",
+        basename_template=f"{uuid4().hex}-{{i}}.parquet",
+        existing_data_behavior="overwrite_or_ignore",
+        max_rows_per_file=max_rows,
+        max_rows_per_group=max_rows,
+        file_options=ds.ParquetFileFormat().make_write_options(compression="snappy")
+    )
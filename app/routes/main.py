@@ -1,18 +1,144 @@
+import asyncio
+import csv
 import io
-
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from uuid import uuid4
+
+import pyarrow as pa
+import pyarrow.csv as pacsv
 from fastapi import APIRouter, Request, HTTPException, UploadFile, File
 from fastapi.templating import Jinja2Templates
-from datetime import date
+from datetime import date, timedelta
+from typing import Optional
+from starlette.concurrency import run_in_threadpool
 from starlette.responses import HTMLResponse, StreamingResponse
 from app.services.meteo_service import MeteoService
 from app.services.pse_service import GenerationService
-from app.services.forecast_service import train_model, predict_future
+from app.services.forecast_service import forecast_pv
 
 router = APIRouter()
 templates = Jinja2Templates(directory="app/templates")
 
-# global cache
-LAST_DF = None
+# ostatni wynik każdej sesji (cookie "sid") do pobrania jako CSV:
+# sid -> (czas zapisu, tabela Arrow); wpisy wygasają po RESULT_TTL sekundach,
+# a przy przekroczeniu RESULT_CACHE_SIZE usuwane są najstarsze
+RESULT_TTL = 600
+RESULT_CACHE_SIZE = 32
+_RESULTS = OrderedDict()
+_RESULTS_LOCK = threading.Lock()
+
+# liczba wierszy renderowanych w tabeli HTML; pełne dane są w /download-csv
+PREVIEW_ROWS = 200
+
+# liczba wierszy w jednej porcji strumieniowanego CSV
+CSV_BATCH_ROWS = 16384
+
+# pula procesu prognoz; podmieniana, gdy proces roboczy zginie
+_FORECAST_POOL = None
+_FORECAST_POOL_LOCK = threading.Lock()
+
+
+def forecast_pool() -> ProcessPoolExecutor:
+    # jeden proces: wszystkie prognozy współdzielą plik modelu, a cache
+    # wytrenowanych modeli zostaje w pamięci procesu między żądaniami
+    global _FORECAST_POOL
+
+    with _FORECAST_POOL_LOCK:
+        if _FORECAST_POOL is None:
+            _FORECAST_POOL = ProcessPoolExecutor(max_workers=1)
+
+        return _FORECAST_POOL
+
+
+def reset_forecast_pool(broken: ProcessPoolExecutor):
+    # podmieniamy tylko pulę, która faktycznie się zepsuła - równoległe
+    # żądanie mogło już utworzyć nową
+    global _FORECAST_POOL
+
+    with _FORECAST_POOL_LOCK:
+        if _FORECAST_POOL is broken:
+            _FORECAST_POOL = None
+
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown_forecast_pool():
+    global _FORECAST_POOL
+
+    with _FORECAST_POOL_LOCK:
+        pool, _FORECAST_POOL = _FORECAST_POOL, None
+
+    if pool is not None:
+        pool.shutdown(cancel_futures=True)
+
+
+async def run_forecast(func):
+    loop = asyncio.get_running_loop()
+    pool = forecast_pool()
+
+    try:
+        return await loop.run_in_executor(pool, func)
+    except BrokenProcessPool:
+        # proces roboczy zginął (np. zabity przy braku pamięci) - nowa pula i jedna ponowna próba
+        reset_forecast_pool(pool)
+        return await loop.run_in_executor(forecast_pool(), func)
+
+
+def load_forecast_inputs(since: date = None):
+    # z bazy tylko indeks czasu i wartości; business_date set_index_in_df liczy z indeksu
+    generation = GenerationService()
+    generation_df = generation.load_from_db(since=since, cols=generation.config.fetch_select).set_index_in_df().prepare_to_forecast().dataframe
+
+    meteo = MeteoService()
+    meteo_cols = [meteo.config.df_index, *meteo.config.fetch_select]
+    meteo_df = meteo.load_from_db(since=since, cols=meteo_cols).set_index_in_df().prepare_to_forecast().dataframe
+
+    joined_df = generation_df.join(meteo_df, how="inner")
+    meteo_forecast_df = meteo_df.loc[meteo_df.index.difference(generation_df.index)]
+
+    return joined_df, meteo_forecast_df
+
+def store_result(sid: str, table: pa.Table):
+    now = time.monotonic()
+
+    with _RESULTS_LOCK:
+        _RESULTS[sid] = (now, table)
+        _RESULTS.move_to_end(sid)
+        # kolejność słownika = kolejność zapisu, więc najstarszy wpis jest pierwszy
+        while len(_RESULTS) > RESULT_CACHE_SIZE or next(iter(_RESULTS.values()))[0] < now - RESULT_TTL:
+            _RESULTS.popitem(last=False)
+
+def get_result(sid: Optional[str]) -> Optional[pa.Table]:
+    with _RESULTS_LOCK:
+        entry = _RESULTS.get(sid)
+
+    if entry is None or entry[0] < time.monotonic() - RESULT_TTL:
+        return None
+
+    return entry[1]
+
+def render_result(request: Request, df):
+    sid = request.cookies.get("sid") or uuid4().hex
+    store_result(sid, to_csv_table(df))
+    result_html = df.head(PREVIEW_ROWS).to_html(classes="table table-striped", index=False)
+
+    response = templates.TemplateResponse(
+        "result_table.html",
+        {
+            "request": request,
+            "result_html": result_html,
+            "rows_shown": min(len(df), PREVIEW_ROWS),
+            "rows_total": len(df)
+        }
+    )
+    response.set_cookie("sid", sid, max_age=RESULT_TTL, httponly=True, samesite="lax")
+
+    return response
 
 @router.get("/")
 def index(request: Request):
@@ -26,21 +152,11 @@ def fetch_meteo(request: Request, start_date: date, end_date: date, latitude: fl
                 detail="start date nie może być późniejsza niż end date"
                 )
 
-    global LAST_DF
-
     try:
         result = MeteoService().fetch_history(start_date, end_date, latitude, longitude)
         result.save_to_db()
-        LAST_DF = result.dataframe
-        result_html = result.dataframe.to_html(classes="table table-striped", index=False)
-
-        return templates.TemplateResponse(
-            "result_table.html",
-            {
-                "request": request,
-                "result_html": result_html
-            }
-        )
+
+        return render_result(request, result.dataframe)
 
     except Exception as e:
         raise HTTPException(
@@ -52,21 +168,11 @@ def fetch_meteo(request: Request, start_date: date, end_date: date, latitude: fl
 @router.get("/fetch_meteo_forecast", response_class=HTMLResponse)
 def fetch_meteo_forecast(request: Request, latitude: float, longitude: float):
 
-    global LAST_DF
-
     try:
         result = MeteoService().fetch_forecast(latitude, longitude)
         result.save_to_db()
-        LAST_DF = result.dataframe
-        result_html = result.dataframe.to_html(classes="table table-striped", index=False)
-
-        return templates.TemplateResponse(
-            "result_table.html",
-            {
-                "request": request,
-                "result_html": result_html
-            }
-        )
+
+        return render_result(request, result.dataframe)
 
     except Exception as e:
         raise HTTPException(
@@ -77,8 +183,6 @@ def fetch_meteo_forecast(request: Request, latitude: float, longitude: float):
 @router.get("/fetch_generation", response_class=HTMLResponse)
 def fetch_generation(request: Request, start_date: date, end_date: date):
 
-    global LAST_DF
-
     if start_date > end_date:
         raise HTTPException(
                 status_code=400,
@@ -88,16 +192,8 @@ def fetch_generation(request: Request, start_date: date, end_date: date):
     try:
         result = GenerationService().fetch_data(start_date, end_date)
         result.save_to_db()
-        LAST_DF = result.dataframe
-        result_html = result.dataframe.to_html(classes="table table-striped", index=False)
-
-        return templates.TemplateResponse(
-            "result_table.html",
-            {
-                "request": request,
-                "result_html": result_html
-            }
-        )
+
+        return render_result(request, result.dataframe)
 
     except Exception as e:
         raise HTTPException(
@@ -107,32 +203,23 @@ def fetch_generation(request: Request, start_date: date, end_date: date):
 
 
 @router.get("/create_forecast", response_class=HTMLResponse)
-def create_forecast(request: Request, model_name: str = 'RandomForestRegressor', steps: int = 24, n_lags: int = 24):
+async def create_forecast(request: Request, model_name: str = 'RandomForestRegressor', steps: int = 24, n_lags: int = 24,
+                          history_days: Optional[int] = None):
 
-    global LAST_DF
+    # history_days ogranicza historię treningową do ostatnich dni (domyślnie cała baza)
+    since = date.today() - timedelta(days=history_days) if history_days is not None else None
 
     try:
-        generation_df = GenerationService().load_from_db().set_index_in_df().prepare_to_forecast().dataframe
-        meteo_df = MeteoService().load_from_db().set_index_in_df().prepare_to_forecast().dataframe
-
-        joined_df = generation_df.join(meteo_df, how="inner")
-        meteo_forecast_df = meteo_df[~meteo_df.index.isin(generation_df.index)]
-
-        train_model(joined_df, "fcst_pv_tot_gen", model_name=model_name, n_lags=n_lags)
-
-        result = predict_future(joined_df, meteo_forecast_df, "fcst_pv_tot_gen", steps=steps)
-        LAST_DF = result
+        joined_df, meteo_forecast_df = await run_in_threadpool(load_forecast_inputs, since)
 
-        result_html = result.to_html(classes="table table-striped", index=False)
-
-        return templates.TemplateResponse(
-            "result_table.html",
-            {
-                "request": request,
-                "result_html": result_html
-            }
+        # trening i predykcja są obciążające CPU - poza procesem serwera
+        result = await run_forecast(
+            partial(forecast_pv, joined_df, meteo_forecast_df, "fcst_pv_tot_gen",
+                    model_name=model_name, steps=steps, n_lags=n_lags)
         )
 
+        return render_result(request, result)
+
     except Exception as e:
         raise HTTPException(
             status_code=400,
@@ -141,24 +228,15 @@ def create_forecast(request: Request, model_name: str = 'RandomForestRegressor',
 
 
 @router.post("/upload", response_class=HTMLResponse)
-async def upload_file(request: Request ,file: UploadFile = File(...)):
-
-    global LAST_DF
+def upload_file(request: Request ,file: UploadFile = File(...)):
+    # zwykły def - parsowanie i zapis do bazy blokują, więc FastAPI uruchamia je w puli wątków
 
     try:
-        content = await file.read()
-        result = GenerationService().load_from_file(file.filename, content)
+        # plik czytany strumieniowo przez parser, bez kopiowania całej treści do pamięci
+        result = GenerationService().load_from_file(file.filename, file.file)
         result.save_to_db()
-        LAST_DF = result.dataframe
-
-        result_html = result.dataframe.to_html(classes="table table-striped", index=False)
-        return templates.TemplateResponse(
-            "result_table.html",
-            {
-                "request": request,
-                "result_html": result_html
-            }
-        )
+
+        return render_result(request, result.dataframe)
 
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -168,44 +246,71 @@ async def upload_file(request: Request ,file: UploadFile = File(...)):
 @router.get("/get_agg_data", response_class=HTMLResponse)
 def get_generation_data(request: Request, table: str):
 
-    global LAST_DF
-
     try:
         if table == "generation":
             result = GenerationService().get_dates_list()
         elif table == "meteo":
             result = MeteoService().get_dates_list()
 
-        LAST_DF = result
-
-        result_html = result.to_html(classes="table table-striped", index=False)
-
-        return templates.TemplateResponse(
-            "result_table.html",
-            {
-                "request": request,
-                "result_html": result_html
-            }
-        )
+        return render_result(request, result)
     except Exception as e:
         raise HTTPException(
             status_code=400,
             detail=f'Błąd podczas pobierania danych z bazy: {e}'
         )
 
+def to_csv_table(df) -> pa.Table:
+    # tabela Arrow gotowa do zapisu jako CSV; konwersja z pandas raz, przy zapisie wyniku
+    table = pa.Table.from_pandas(df, preserve_index=False)
+
+    # znaczniki czasu bez części ułamkowej zapisujemy z dokładnością do sekund,
+    # a same północe jako daty - tak jak robił to DataFrame.to_csv (pozostałe
+    # różnice formatu opisane w iter_csv)
+    for i, field in enumerate(table.schema):
+        if pa.types.is_timestamp(field.type):
+            col = table.column(i)
+            days = col.cast(pa.date32())
+            if field.type.tz is None and days.cast(field.type).equals(col):
+                table = table.set_column(i, field.name, days)
+                continue
+            try:
+                table = table.set_column(i, field.name, col.cast(pa.timestamp("s", field.type.tz)))
+            except pa.ArrowInvalid:
+                pass
+
+    return table
+
+def iter_csv(table: pa.Table):
+    # CSV formatowany przez pyarrow i wysyłany porcjami, bez budowania całego pliku w pamięci.
+    # Nagłówek zapisujemy sami, bez cudzysłowów jak DataFrame.to_csv (pyarrow cytuje go zawsze).
+    # Różnice względem to_csv: pyarrow zawsze cytuje wartości tekstowe, a liczby
+    # zmiennoprzecinkowe formatuje po swojemu, np. 1.0 zapisywane jest jako 1
+    header = io.StringIO()
+    csv.writer(header, lineterminator="\n").writerow(table.column_names)
+    yield header.getvalue().encode()
+
+    sink = io.BytesIO()
+    options = pacsv.WriteOptions(include_header=False, quoting_style="needed")
+
+    with pacsv.CSVWriter(sink, table.schema, write_options=options) as writer:
+        for batch in table.to_batches(max_chunksize=CSV_BATCH_ROWS):
+            writer.write_batch(batch)
+            yield sink.getvalue()
+            sink.seek(0)
+            sink.truncate()
+
+    if sink.tell():
+        yield sink.getvalue()
+
 @router.get("/download-csv")
-def download_csv():
-    global LAST_DF
+def download_csv(request: Request):
+    table = get_result(request.cookies.get("sid"))
 
-    if LAST_DF is None:
+    if table is None:
         return {"ERROR:" "Brak danych do zapisania"}
 
-    buffer = io.BytesIO()
-    LAST_DF.to_csv(buffer, index=False)
-    buffer.seek(0)
-
     return StreamingResponse(
-        buffer,
+        iter_csv(table),
         media_type="text/csv",
-        headers={"Content=Disposition": "attachment; filename=data.csv"},
+        headers={"Content-Disposition": "attachment; filename=data.csv"},
     )
@@ -3,9 +3,66 @@ from sklearn.pipeline import Pipeline
 from sklearn.preprocessing import StandardScaler
 import pandas as pd
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 import joblib
+import hashlib
+import os
+from functools import lru_cache
 from importlib import import_module
 
+# dodatkowe parametry konstruktora dla wybranych modeli
+MODEL_KWARGS = {
+    "RandomForestRegressor": {"n_jobs": -1, "random_state": 0},
+    "HistGradientBoostingRegressor": {"random_state": 0},
+}
+
+# modele zastępowane szybszym odpowiednikiem (histogramowy boosting zamiast dokładnego)
+MODEL_ALIASES = {
+    "GradientBoostingRegressor": "HistGradientBoostingRegressor",
+}
+
+# model_path -> (klucz danych i parametrów, st_mtime_ns zapisanego pliku)
+_TRAINED_KEYS = {}
+
+# (nazwa cechy, okres)
+CYCLES = (("dt_hour", 24), ("dt_dayofyear", 365), ("dt_month", 12))
+CALENDAR_COLS = [base for base, _ in CYCLES] + [f"{base}_{fn}" for base, _ in CYCLES for fn in ("sin", "cos")]
+
+def _calendar_components(index):
+    """
+    Zwraca (godzina, dzień roku, miesiąc) jako float32, liczone arytmetyką
+    na datetime64 zamiast osobnych akcesorów indeksu.
+    """
+    ts = index.to_numpy().astype("datetime64[h]")
+    days = ts.astype("datetime64[D]")
+    months = ts.astype("datetime64[M]")
+    years = ts.astype("datetime64[Y]")
+
+    hour = (ts - days).astype(np.int64)
+    dayofyear = (days - years).astype(np.int64) + 1
+    month = (months - years).astype(np.int64) + 1
+
+    return hour.astype(np.float32), dayofyear.astype(np.float32), month.astype(np.float32)
+
+def _calendar_block(index):
+    """
+    Zwraca macierz float32 (n, len(CALENDAR_COLS)): składowe kalendarza,
+    a po nich kolumny sin/cos na przemian. Macierz alokowana jest raz,
+    kąty dla wszystkich okresów liczone jednym mnożeniem, a sin i cos
+    zapisywane bezpośrednio do jej kolumn.
+    """
+    n_cycles = len(CYCLES)
+    scale = np.array([2 * np.pi / period for _, period in CYCLES], dtype=np.float32)
+
+    out = np.empty((len(index), len(CALENDAR_COLS)), dtype=np.float32)
+    out[:, :n_cycles] = np.column_stack(_calendar_components(index))
+
+    theta = out[:, :n_cycles] * scale
+    np.sin(theta, out=out[:, n_cycles::2])
+    np.cos(theta, out=out[:, n_cycles + 1::2])
+
+    return out
+
 class CyclicalFeatures(BaseEstimator, TransformerMixin):
     def __init__(self, pv_output, n_lags=24):
 
@@ -16,29 +73,31 @@ class CyclicalFeatures(BaseEstimator, TransformerMixin):
         return self
 
     def transform(self, X):
-        df = X.copy()
-
-        df["dt_hour"] = df.index.hour
-        df["dt_dayofyear"] = df.index.dayofyear
-        df["dt_month"] = df.index.month
-
-        df["dt_hour_sin"] = np.sin(2 * np.pi * df["dt_hour"] / 24)
-        df["dt_hour_cos"] = np.cos(2 * np.pi * df["dt_hour"] / 24)
-        df["dt_dayofyear_sin"] = np.sin(2 * np.pi * df["dt_dayofyear"] / 365)
-        df["dt_dayofyear_cos"] = np.cos(2 * np.pi * df["dt_dayofyear"] / 365)
-        df["dt_month_sin"] = np.sin(2 * np.pi * df["dt_month"] / 12)
-        df["dt_month_cos"] = np.cos(2 * np.pi * df["dt_month"] / 12)
-
-        for i in range(1, self.n_lags + 1):
-            df[f"{self.pv_output}_lag_{i}"] = df[f"{self.pv_output}"].shift(i)
+        lag_cols = [f"{self.pv_output}_lag_{i}" for i in range(1, self.n_lags + 1)]
 
-        lag_cols =[f"{self.pv_output}_lag_{i}" for i in range(1, self.n_lags + 1)]
-        df = df.dropna(subset=lag_cols)
+        # macierz lagów jako widok okien przesuwnych: wiersz dla chwili t to
+        # pv[t-n_lags:t] w odwróconej kolejności (lag_1 = pv[t-1]); pierwsze
+        # n_lags chwil nie mają pełnego zestawu lagów i są pomijane
+        if self.n_lags:
+            pv_col = X[self.pv_output]
+            pv = pv_col.to_numpy(np.result_type(pv_col.dtype, np.float32))
+            if len(pv) > self.n_lags:
+                lags = sliding_window_view(pv, self.n_lags)[:-1, ::-1]
+            else:
+                lags = np.empty((0, self.n_lags), dtype=pv.dtype)
+        else:
+            lags = np.empty((len(X), 0), dtype=np.float32)
 
-        if self.pv_output in df.columns:
-            df= df.drop(columns=[self.pv_output])
+        # wiersze z brakami w lagach odrzucamy przed złożeniem ramki
+        keep = ~np.isnan(lags).any(axis=1)
+        rows = X.iloc[len(X) - len(lags):].loc[keep]
+        index = rows.index
 
-        return df
+        return pd.concat([
+            rows.drop(columns=[self.pv_output], errors="ignore"),
+            pd.DataFrame(_calendar_block(index), index=index, columns=CALENDAR_COLS),
+            pd.DataFrame(lags[keep], index=index, columns=lag_cols),
+        ], axis=1)
 
 def train_model(df: pd.DataFrame, pv_output: str, model_name: str, model_path: str = "pv_model.pkl", n_lags: int = 24):
     """
@@ -47,15 +106,19 @@ def train_model(df: pd.DataFrame, pv_output: str, model_name: str, model_path: s
     """
 
     y = df[pv_output]
-    X = df.copy()
 
     transformer = CyclicalFeatures(pv_output=pv_output, n_lags=n_lags)
+    model_name = MODEL_ALIASES.get(model_name, model_name)
+
+    # las losowy i tak rzutuje cechy na float32 przy fit i predict - rzutujemy raz,
+    # przed budową cech; pozostałe modele dostają dane w typie, w jakim przyszły
+    X = df.astype(np.float32) if model_name == "RandomForestRegressor" else df
 
     if model_name in ["LinearRegression", "Ridge", "Lasso"]:
         module = import_module("sklearn.linear_model")
     elif model_name in ["DecisionTreeRegressor"]:
         module = import_module("sklearn.tree")
-    elif model_name in ["RandomForestRegressor", "GradientBoostingRegressor"]:
+    elif model_name in ["RandomForestRegressor", "HistGradientBoostingRegressor"]:
         module = import_module("sklearn.ensemble")
     elif model_name in ["SVR"]:
         module = import_module("sklearn.svm")
@@ -69,18 +132,64 @@ def train_model(df: pd.DataFrame, pv_output: str, model_name: str, model_path: s
     pipeline = Pipeline([
         ("features", transformer),
         ("scaler", StandardScaler()),
-        ("model", model())
+        ("model", model(**MODEL_KWARGS.get(model_name, {})))
     ])
 
+    # cechy liczone raz; Pipeline.fit policzyłby je ponownie
     X_trans = pipeline.named_steps["features"].transform(X)
-    y_aligned = y.iloc[-len(X_trans):]
+    y_aligned = y.iloc[-len(X_trans):].to_numpy()
 
-    pipeline.fit(X, y_aligned)
+    X_scaled = pipeline.named_steps["scaler"].fit_transform(X_trans)
+    pipeline.named_steps["model"].fit(X_scaled, y_aligned)
 
-    joblib.dump(pipeline, model_path)
+    # zapis do pliku tymczasowego i podmiana - czytający nigdy nie trafi
+    # na niedokończony plik modelu
+    tmp_path = f"{model_path}.tmp"
+    joblib.dump(pipeline, tmp_path)
+    os.replace(tmp_path, model_path)
 
     return {"status": "trained", "model_path": model_path}
 
+def data_fingerprint(df: pd.DataFrame) -> str:
+    """
+    Skrót zawartości DataFrame (wartości + indeks).
+    """
+    hashes = pd.util.hash_pandas_object(df, index=True).to_numpy()
+
+    return hashlib.blake2b(hashes.tobytes(), digest_size=16).hexdigest()
+
+def get_or_train_model(df: pd.DataFrame, pv_output: str, model_name: str, model_path: str = "pv_model.pkl", n_lags: int = 24):
+    """
+    Trenuje model tylko wtedy, gdy dane lub parametry zmieniły się od
+    ostatniego treningu zapisanego pod model_path; w przeciwnym razie
+    zostawia istniejący plik modelu.
+    """
+
+    key = (data_fingerprint(df), pv_output, model_name, n_lags)
+    # plik mógł zostać podmieniony przez inny proces - model z pamięci
+    # podręcznej tylko wtedy, gdy plik jest tym, który sami zapisaliśmy
+    try:
+        mtime_ns = os.stat(model_path).st_mtime_ns
+    except FileNotFoundError:
+        mtime_ns = None
+    if mtime_ns is not None and _TRAINED_KEYS.get(model_path) == (key, mtime_ns):
+        return {"status": "cached", "model_path": model_path}
+
+    result = train_model(df, pv_output, model_name=model_name, model_path=model_path, n_lags=n_lags)
+    _TRAINED_KEYS[model_path] = (key, os.stat(model_path).st_mtime_ns)
+
+    return result
+
+@lru_cache(maxsize=1)
+def _load_pipeline(model_path: str, mtime_ns: int):
+    """
+    Wczytuje pipeline z pliku; kolejne wywołania dla tej samej wersji pliku
+    (ścieżka + czas modyfikacji) zwracają obiekt z pamięci. Trzymana jest
+    tylko ostatnia wersja - po ponownym treningu stary model jest zwalniany.
+    """
+
+    return joblib.load(model_path)
+
 def predict_future(
     history_df: pd.DataFrame,
     future_weather: pd.DataFrame,
@@ -94,31 +203,63 @@ def predict_future(
     future_weather – przyszłe dane pogodowe (bez pv_output)
     """
 
-    pipeline = joblib.load(model_path)
+    pipeline = _load_pipeline(model_path, os.stat(model_path).st_mtime_ns)
+    n_lags = pipeline.named_steps["features"].n_lags
+    scaler = pipeline.named_steps["scaler"]
+    model = pipeline.named_steps["model"]
 
-    df = history_df.copy()
-    preds = []
+    weather_cols = [c for c in history_df.columns if c != pv_output]
+    lag_cols = [f"{pv_output}_lag_{i}" for i in range(1, n_lags + 1)]
+    if hasattr(scaler, "feature_names_in_") and list(scaler.feature_names_in_) != weather_cols + CALENDAR_COLS + lag_cols:
+        raise ValueError("Kolumny danych nie pasują do kolumn, na których wytrenowano model")
+
+    # cechy pogodowe i kalendarzowe horyzontu liczone i skalowane raz, wektorowo
+    # (skalowanie jak StandardScaler.transform)
+    future = future_weather.iloc[:steps]
+    n_static = len(weather_cols) + len(CALENDAR_COLS)
+    static = np.hstack([future[weather_cols].to_numpy(np.float64), _calendar_block(future.index)])
+    static = (static - scaler.mean_[:n_static]) / scaler.scale_[:n_static]
+    lag_mean, lag_scale = scaler.mean_[n_static:], scaler.scale_[n_static:]
 
-    for i in range(steps):
-        row = future_weather.iloc[i:i+1].copy()
-        row[pv_output] = df[pv_output].iloc[-1]  # placeholder
+    # ostatnie n_lags wartości pv_output, od najnowszej (lag_1) do najstarszej
+    lags = history_df[pv_output].tail(n_lags).to_numpy(np.float64)[::-1].copy()
 
-        # budujemy cechy tak jak w pipeline
-        features = pipeline.named_steps["features"].transform(
-            pd.concat([df.tail(24), row])
-        ).tail(1)
+    # wektor cech alokowany raz i nadpisywany w każdym kroku
+    feat = np.empty((1, n_static + n_lags))
+    preds = []
 
-        # skalowanie + predykcja
-        X_scaled = pipeline.named_steps["scaler"].transform(features)
-        y_pred = pipeline.named_steps["model"].predict(X_scaled)[0]
+    for i in range(len(future)):
+        feat[0, :n_static] = static[i]
+        np.subtract(lags, lag_mean, out=feat[0, n_static:])
+        feat[0, n_static:] /= lag_scale
+
+        y_pred = model.predict(feat)[0]
 
         preds.append(float(y_pred))
 
-        # dodajemy predykcję do historii
-        new_row = row.copy()
-        new_row[pv_output] = y_pred
-        df = pd.concat([df, new_row])
+        # predykcja staje się najnowszym lagiem
+        if n_lags:
+            lags[1:] = lags[:-1]
+            lags[0] = y_pred
 
-    future_index = future_weather.index[:steps]
+    future_index = future.index
 
     return pd.DataFrame({"plan_dtime": future_index, "pv_output": preds})
+
+def forecast_pv(
+    history_df: pd.DataFrame,
+    future_weather: pd.DataFrame,
+    pv_output: str,
+    model_name: str,
+    model_path: str = "pv_model.pkl",
+    steps: int = 24,
+    n_lags: int = 24
+):
+    """
+    Trenuje model (o ile dane się zmieniły) i wyznacza prognozę PV.
+    Funkcja modułowa, aby można ją było uruchomić w osobnym procesie.
+    """
+
+    get_or_train_model(history_df, pv_output, model_name=model_name, model_path=model_path, n_lags=n_lags)
+
+    return predict_future(history_df, future_weather, pv_output, model_path=model_path, steps=steps)
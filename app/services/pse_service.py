@@ -1,10 +1,12 @@
+import numpy as np
 import pandas as pd
+from typing import List
 from datetime import date, timedelta
-from pathlib import Path
-from sqlalchemy import MetaData, Table, select, func
-from app.core.db import make_engine
+from sqlalchemy import Date, column, select, func, text
+from app.core.db import get_engine, insert_dataframe, reflect_table
 from app.core.fetcher import fetch_data_pse
 from app.core.file_loader import load_file_to_dataframe
+from app.core.parquet_writer import write_partitioned_parquet
 from config.config import PseServiceConfig
 
 
@@ -17,9 +19,16 @@ class GenerationService:
 
 
     def set_index_in_df(self):
-        self.dataframe[self.config.df_index] = pd.to_datetime(self.dataframe[self.config.df_index])
+        timestamps = self.dataframe[self.config.df_index]
+        try:
+            # API i baza zwracają ISO 8601 - parsowanie bez zgadywania formatu
+            self.dataframe[self.config.df_index] = pd.to_datetime(timestamps, format="ISO8601")
+        except ValueError:
+            # wczytane pliki mogą mieć inny format daty
+            self.dataframe[self.config.df_index] = pd.to_datetime(timestamps)
         self.dataframe.set_index(self.config.df_index, inplace=True)
-        self.dataframe[self.config.parquet_partition_col] = self.dataframe.index.date
+        # dzień jako datetime64 zamiast obiektów date w kolumnie object
+        self.dataframe[self.config.parquet_partition_col] = self.dataframe.index.values.astype("datetime64[D]")
 
         return self
 
@@ -32,20 +41,15 @@ class GenerationService:
 
 
     def save_to_parquet(self):
-        output_path = Path(self.config.parquet_output_path)
-        output_path.parent.mkdir(parents=True, exist_ok=True)
-        self.dataframe.to_parquet(output_path, partition_cols=[self.config.parquet_partition_col], index=True, engine="pyarrow")
+        write_partitioned_parquet(self.dataframe, self.config.parquet_output_path,
+                                  self.config.parquet_partition_col, self.config.parquet_max_rows_per_file)
 
         return self
 
 
     def save_to_db(self):
-        engine = make_engine(self.config.db_path)
-        self.dataframe.to_sql(name=self.config.db_table,
-                              con=engine,
-                              if_exists="append",
-                              index=True,
-                              method="multi")
+        engine = get_engine(self.config.db_path)
+        insert_dataframe(engine, self.config.db_table, self.dataframe, dtype={self.config.parquet_partition_col: Date})
 
         return self
 
@@ -57,53 +61,72 @@ class GenerationService:
         }
 
 
-    def load_from_file(self, filename, content):
-        self.dataframe = load_file_to_dataframe(filename, content, self.config.file_columns)
+    def load_from_file(self, filename, source):
+        self.dataframe = load_file_to_dataframe(filename, source, self.config.file_columns)
         self.set_index_in_df()
 
         return self
 
 
-    def load_from_db(self) -> pd.DataFrame:
-        engine = make_engine(self.config.db_path)
-        metadata = MetaData()
+    def load_from_db(self, since: date = None, cols: List[str] = None) -> pd.DataFrame:
+        engine = get_engine(self.config.db_path)
         try:
-            table = Table(self.config.db_table, metadata, autoload_with=engine)
+            table = reflect_table(self.config.db_path, self.config.db_table)
         except Exception as e:
             raise RuntimeError(f"Failed to load table '{self.config.db_table}': {e}") from e
-        stmt = select(table)
+        # tylko potrzebne kolumny i dni od `since` - filtr po business_date w SQL
+        # kolumny bez typu (column()) - wartości trafiają do pandas tak, jak zwraca je
+        # sterownik, bez konwersji SQLAlchemy komórka po komórce; daty parsuje set_index_in_df
+        stmt = select(*[column(c) for c in cols or table.c.keys()]).select_from(table)
+        if since is not None:
+            stmt = stmt.where(table.c[self.config.parquet_partition_col] >= since)
+        if engine.dialect.name == "sqlite":
+            # kolejność wstawiania - prepare_to_forecast zostawia ostatnio zapisany duplikat
+            stmt = stmt.order_by(text("rowid"))
         with engine.connect() as conn:
-            result = conn.execute(stmt)
-            rows = result.fetchall()
-            cols = result.keys()
-            self.dataframe = pd.DataFrame(rows, columns=cols)
+            chunks = pd.read_sql_query(stmt, conn, chunksize=self.config.db_chunksize)
+            self.dataframe = pd.concat(chunks, ignore_index=True)
 
         return self
 
 
     def prepare_to_forecast(self):
         self.dataframe.drop([self.config.parquet_partition_col], axis=1, inplace=True)
+        # posortowany, unikalny indeks - join liniowym scalaniem zamiast haszowania
+        self.dataframe = self.dataframe[~self.dataframe.index.duplicated(keep="last")].sort_index()
+        # do modelu float32 - połowa pamięci i mniejsza ramka przekazywana do procesu
+        # prognozy; w bazie i parquet wartości zostają float64
+        float_cols = self.dataframe.select_dtypes("float64").columns
+        self.dataframe[float_cols] = self.dataframe[float_cols].astype(np.float32)
 
         return self
 
 
     def get_dates_list(self):
-        engine = make_engine(self.config.db_path)
-        metadata = MetaData()
+        engine = get_engine(self.config.db_path)
         try:
-            table = Table(self.config.db_table, metadata, autoload_with=engine)
+            table = reflect_table(self.config.db_path, self.config.db_table)
         except Exception as e:
             raise RuntimeError(f"Failed to reflect table '{self.config.db_table}': {e}") from e
 
+        # data bez typu SQLAlchemy (bez obiektów date per wiersz), kolumny
+        # ramki budowane od razu z docelowymi typami
+        business_date = column(self.config.parquet_partition_col)
         stmt = (
             select(
-                table.c.business_date,
+                business_date,
                 func.count().label("cnt")
             )
-            .group_by(table.c.business_date)
+            .select_from(table)
+            .group_by(business_date)
         )
 
         with engine.connect() as conn:
-            result = conn.execute(stmt).fetchall()
+            rows = conn.execute(stmt).all()
+
+        dates, counts = zip(*rows) if rows else ((), ())
 
-        return pd.DataFrame(result, columns=["business_date", "cnt"])
\ No newline at end of file
+        return pd.DataFrame({
+            "business_date": pd.to_datetime(pd.Index(dates), format="ISO8601"),
+            "cnt": pd.Index(counts, dtype="int64")
+        })
\ No newline at end of file
@@ -14,14 +14,18 @@ class MeteoServiceConfig(BaseModel):
     df_index: str = "time"
     parquet_output_path: str = 'app/data/meteo_data'
     parquet_partition_col: str = "business_date"
+    parquet_max_rows_per_file: int = 200_000
     db_path: str = 'sqlite:///app/data/app.db'
     db_table: str = 'meteo'
+    db_chunksize: int = 50_000
 
 class PseServiceConfig(BaseModel):
     fetch_select: List[str] = ["plan_dtime", "fcst_pv_tot_gen"]
     df_index: str = "plan_dtime"
     parquet_output_path: str = 'app/data/pse_data'
     parquet_partition_col: str = "business_date"
+    parquet_max_rows_per_file: int = 200_000
     db_path: str = 'sqlite:///app/data/app.db'
     db_table: str = 'pse'
+    db_chunksize: int = 50_000
     file_columns: List[str] = ["plan_dtime", "fcst_pv_tot_gen"]
\ No newline at end of file
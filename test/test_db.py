@@ -0,0 +1,62 @@
+import os
+import numpy as np
+import pandas as pd
+from sqlalchemy import Date
+
+# ustawienia API są wymagane przy imporcie serwisów, testy nie łączą się z API
+for name in ("API_URL_PSE", "API_URL_METEO_HIST", "API_URL_METEO_FRCST"):
+    os.environ.setdefault(name, "http://localhost")
+
+from app.core.db import get_engine, insert_dataframe
+from app.services.pse_service import GenerationService
+
+
+def make_frame():
+    index = pd.DatetimeIndex(
+        ["2024-01-01 00:00:00", "2024-01-01 00:15:00.250000", "2024-01-01 00:30:00", "2024-01-02 23:45:00"],
+        name="plan_dtime",
+    )
+    return pd.DataFrame(
+        {
+            "fcst_pv_tot_gen": [1.5, np.nan, 3.25, 1e-7],
+            "business_date": pd.to_datetime(["2024-01-01", "2024-01-01", None, "2024-01-02"]),
+        },
+        index=index,
+    )
+
+
+def stored_rows(engine, table):
+    # quote() zwraca dokładny literał SQLite (typ i zapis), więc porównanie jest bajt w bajt
+    with engine.connect() as conn:
+        return conn.exec_driver_sql(
+            f"SELECT quote(plan_dtime), quote(fcst_pv_tot_gen), quote(business_date) FROM {table} ORDER BY rowid"
+        ).fetchall()
+
+
+def test_insert_dataframe_matches_to_sql(tmp_path):
+    engine = get_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    df = make_frame()
+
+    # wiersze 2..n idą przez exec_driver_sql, a muszą być zapisane jak przez to_sql
+    assert insert_dataframe(engine, "pse", df, dtype={"business_date": Date}) == len(df)
+    df.to_sql(name="pse_ref", con=engine, index=True, dtype={"business_date": Date})
+
+    assert stored_rows(engine, "pse") == stored_rows(engine, "pse_ref")
+
+
+def test_insert_dataframe_round_trip(tmp_path):
+    service = GenerationService()
+    service.config.db_path = f"sqlite:///{tmp_path / 'test.db'}"
+    service.dataframe = make_frame()
+    service.save_to_db()
+
+    loaded = GenerationService()
+    loaded.config.db_path = service.config.db_path
+    raw = loaded.load_from_db().dataframe
+
+    assert raw["business_date"].fillna("").tolist() == ["2024-01-01", "2024-01-01", "", "2024-01-02"]
+
+    loaded.set_index_in_df()
+    expected = make_frame()
+    pd.testing.assert_index_equal(loaded.dataframe.index, expected.index, check_exact=True)
+    np.testing.assert_array_equal(loaded.dataframe["fcst_pv_tot_gen"].to_numpy(), expected["fcst_pv_tot_gen"].to_numpy())
@@ -0,0 +1,52 @@
+import joblib
+import numpy as np
+import pandas as pd
+
+from app.services.forecast_service import train_model, predict_future
+
+
+def make_frames(n_lags):
+    index = pd.date_range("2024-01-01", periods=24 * 10, freq="h")
+    rng = np.random.default_rng(0)
+    hour = index.hour.to_numpy()
+    df = pd.DataFrame(
+        {
+            "temp": rng.normal(size=len(index)),
+            "cloud": rng.random(len(index)),
+            "pv": np.clip(np.sin((hour - 6) / 12 * np.pi), 0, None) * 1000 + rng.normal(0, 10, len(index)),
+        },
+        index=index,
+    )
+    return df.iloc[:-24], df.iloc[-24:].drop(columns="pv")
+
+
+def reference_forecast(pipeline, history, future, steps):
+    # rekurencja krok po kroku przez kroki pipeline'u: cechy z okna historii,
+    # StandardScaler.transform i model.predict
+    n_lags = pipeline.named_steps["features"].n_lags
+    window = history.tail(n_lags)
+    preds = []
+
+    for ts, row in future.iloc[:steps].iterrows():
+        # pv bieżącego wiersza nie trafia do jego cech - tylko do lagów kolejnych kroków
+        step = pd.DataFrame([{**row.to_dict(), "pv": 0.0}], index=[ts])
+        features = pipeline.named_steps["features"].transform(pd.concat([window, step])).tail(1)
+        y_pred = pipeline.named_steps["model"].predict(pipeline.named_steps["scaler"].transform(features))[0]
+
+        preds.append(y_pred)
+        step["pv"] = y_pred
+        window = pd.concat([window, step]).tail(n_lags)
+
+    return np.array(preds)
+
+
+def test_predict_future_matches_pipeline(tmp_path):
+    model_path = str(tmp_path / "model.pkl")
+    history, future = make_frames(n_lags=6)
+    train_model(history, "pv", model_name="Ridge", model_path=model_path, n_lags=6)
+
+    result = predict_future(history, future, "pv", model_path=model_path, steps=12)
+    expected = reference_forecast(joblib.load(model_path), history, future, steps=12)
+
+    assert result["plan_dtime"].tolist() == future.index[:12].tolist()
+    np.testing.assert_allclose(result["pv_output"].to_numpy(), expected, rtol=1e-9)